@@ -5,6 +5,8 @@ Reference: Dell iDRAC MIB (iDRAC-SMIv2.mib / IDRAC-MIB-SMIv2.mib)
 Enterprise OID: 1.3.6.1.4.1.674.10892.5
 """
 
+import functools
+
 # Dell enterprise OID prefix
 DELL_ENTERPRISE_OID = "1.3.6.1.4.1.674"
 IDRAC_OID_PREFIX = "1.3.6.1.4.1.674.10892.5"
@@ -28,6 +30,12 @@ TRAP_VARS = {
     "1.3.6.1.4.1.674.10892.5.4.300.1.8": "alertCurrentStatus",
 }
 
+# Same mapping keyed by the OID's integer tuple, so var-binds can be matched
+# without rendering each OID to a dotted string
+TRAP_VARS_BY_TUPLE = {
+    tuple(map(int, oid.split("."))): name for oid, name in TRAP_VARS.items()
+}
+
 # Severity mapping from iDRAC status codes
 SEVERITY_MAP = {
     1: ("other", "ℹ️"),
@@ -38,6 +46,23 @@ SEVERITY_MAP = {
     6: ("nonRecoverable", "🚨"),
 }
 
+# ntfy priority for each severity name
+SEVERITY_TO_NTFY_PRIORITY = {
+    "ok": "low",
+    "other": "default",
+    "unknown": "default",
+    "nonCritical": "high",
+    "critical": "urgent",
+    "nonRecoverable": "urgent",
+}
+
+# Status code -> (severity_name, emoji, ntfy_priority), merged once at import
+STATUS_CODE_TO_ALERT = {
+    code: (name, emoji, SEVERITY_TO_NTFY_PRIORITY.get(name, "default"))
+    for code, (name, emoji) in SEVERITY_MAP.items()
+}
+_UNKNOWN_ALERT = ("unknown", "❓", "default")
+
 # iDRAC trap OID to category mapping
 # These are the specific trap OIDs sent by iDRAC
 TRAP_CATEGORIES = {
@@ -92,26 +117,27 @@ TRAP_CATEGORIES = {
     "1.3.6.1.4.1.674.10892.5": "iDRAC Alert",
 }
 
+# Same mapping keyed by the OID's integer tuple, matching TRAP_VARS_BY_TUPLE
+TRAP_CATEGORIES_BY_TUPLE = {
+    tuple(map(int, oid.split("."))): category for oid, category in TRAP_CATEGORIES.items()
+}
+
 
-def get_trap_category(trap_oid: str) -> str:
-    """Resolve a trap OID to its human-readable category."""
+@functools.lru_cache(maxsize=256)
+def get_trap_category(trap_oid: tuple[int, ...]) -> str:
+    """Resolve a trap OID, given as an integer tuple, to its human-readable category."""
     # Try exact match first
-    if trap_oid in TRAP_CATEGORIES:
-        return TRAP_CATEGORIES[trap_oid]
-    
+    if trap_oid in TRAP_CATEGORIES_BY_TUPLE:
+        return TRAP_CATEGORIES_BY_TUPLE[trap_oid]
+
     # Try prefix match (iDRAC appends notification IDs like .0.10395)
-    for known_oid, category in TRAP_CATEGORIES.items():
-        if trap_oid.startswith(known_oid + "."):
+    for known_oid, category in TRAP_CATEGORIES_BY_TUPLE.items():
+        if len(trap_oid) > len(known_oid) and trap_oid[:len(known_oid)] == known_oid:
             return category
-    
-    return f"iDRAC Alert ({trap_oid})"
-
 
-def get_severity(status_code: int) -> tuple[str, str]:
-    """Return (severity_name, emoji) for a given iDRAC status code."""
-    return SEVERITY_MAP.get(status_code, ("unknown", "❓"))
+    return f"iDRAC Alert ({'.'.join(map(str, trap_oid))})"
 
 
-def resolve_var_name(oid: str) -> str:
-    """Resolve a trap variable OID to a human-readable field name."""
-    return TRAP_VARS.get(oid, oid)
+def get_alert_tuple(status_code: int) -> tuple[str, str, str]:
+    """Return (severity_name, emoji, ntfy_priority) for a given iDRAC status code."""
+    return STATUS_CODE_TO_ALERT.get(status_code, _UNKNOWN_ALERT)
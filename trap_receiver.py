@@ -10,19 +10,21 @@ import logging
 import os
 import signal
 import sys
-import threading
-from datetime import datetime, timezone
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
+from pyasn1.type import univ
 from pysnmp.carrier.asyncio.dgram import udp
 from pysnmp.entity import config, engine
 from pysnmp.entity.rfc3413 import ntfrcv
 
 from idrac_oids import (
     DELL_ENTERPRISE_OID,
-    get_severity,
+    TRAP_VARS_BY_TUPLE,
+    get_alert_tuple,
     get_trap_category,
-    resolve_var_name,
 )
 
 # ---------------------------------------------------------------------------
@@ -36,6 +38,7 @@ NTFY_URL = os.getenv("NTFY_URL", "")            # e.g. https://ntfy.example.com/
 NTFY_TOKEN = os.getenv("NTFY_TOKEN", "")         # Bearer token
 NTFY_PRIORITY = os.getenv("NTFY_PRIORITY", "")   # optional default priority override
 NTFY_TAGS = os.getenv("NTFY_TAGS", "")           # optional extra tags (comma-sep)
+NTFY_WORKERS = int(os.getenv("NTFY_WORKERS", "4"))  # concurrent ntfy senders
 
 IDRAC_LABEL = os.getenv("IDRAC_LABEL", "iDRAC")  # friendly name for the server
 
@@ -51,17 +54,29 @@ logging.basicConfig(
 )
 log = logging.getLogger("idrac2ntfy")
 
+# Extra tags parsed once; NTFY_TAGS never changes at runtime
+_EXTRA_TAGS = tuple(t.strip() for t in NTFY_TAGS.split(",") if t.strip())
+
+# Compared arc by arc, so e.g. 1.3.6.1.4.1.6740… is not mistaken for a Dell OID
+_DELL_PREFIX = tuple(map(int, DELL_ENTERPRISE_OID.split(".")))
+
 # ---------------------------------------------------------------------------
-# ntfy priority mapping
+# HTTP session (keep-alive connection reused across alerts)
 # ---------------------------------------------------------------------------
-SEVERITY_TO_NTFY_PRIORITY = {
-    "ok": "low",
-    "other": "default",
-    "unknown": "default",
-    "nonCritical": "high",
-    "critical": "urgent",
-    "nonRecoverable": "urgent",
-}
+_SESSION = requests.Session()
+# Retry only failed connection attempts; a POST that reached ntfy is never
+# re-sent, so a retry cannot produce a duplicate notification
+_ADAPTER = HTTPAdapter(pool_connections=1, pool_maxsize=NTFY_WORKERS, max_retries=2)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# Static headers sent with every alert; per-alert fields are overlaid in send_to_ntfy
+_BASE_HEADERS = {"Content-Type": "text/plain; charset=utf-8"}
+if NTFY_TOKEN:
+    _BASE_HEADERS["Authorization"] = f"Bearer {NTFY_TOKEN}"
+
+# Bounded pool of sender threads so a trap storm cannot spawn unlimited threads
+_EXECUTOR = ThreadPoolExecutor(max_workers=NTFY_WORKERS, thread_name_prefix="ntfy")
 
 
 def send_to_ntfy(title: str, message: str, priority: str, tags: list[str]) -> None:
@@ -71,54 +86,80 @@ def send_to_ntfy(title: str, message: str, priority: str, tags: list[str]) -> No
         return
 
     headers = {
+        **_BASE_HEADERS,
         "Title": title,
         "Priority": priority,
         "Tags": ",".join(tags),
-        "Authorization": f"Bearer {NTFY_TOKEN}",
     }
 
     try:
-        resp = requests.post(NTFY_URL, data=message.encode("utf-8"), headers=headers, timeout=15)
+        resp = _SESSION.post(NTFY_URL, data=message.encode("utf-8"), headers=headers, timeout=15)
         resp.raise_for_status()
         log.info("Alert forwarded to ntfy  (status %s)", resp.status_code)
     except requests.RequestException as exc:
         log.error("Failed to forward alert to ntfy: %s", exc)
 
 
-def parse_trap_vars(var_binds: list) -> dict:
-    """Extract key-value pairs from SNMP trap variable bindings."""
+# SNMPv2-MIB::snmpTrapOID.0 identifies the trap itself
+_TRAP_OID_TUPLE = (1, 3, 6, 1, 6, 3, 1, 1, 4, 1, 0)
+
+# Trap variables read by build_ntfy_message; all others are skipped while parsing
+_NEEDED_VARS = frozenset((
+    "alertMessage",
+    "alertCurrentStatus",
+    "alertMessageID",
+    "systemFQDN",
+    "systemServiceTag",
+    "chassisServiceTag",
+))
+
+
+def parse_trap_vars(
+    var_binds: list, early_exit_prefix: tuple[int, ...] | None = None
+) -> tuple[dict[str, str], tuple[int, ...]]:
+    """
+    Extract the fields used in notifications and the trap OID from SNMP trap
+    variable bindings.
+    If early_exit_prefix is given and the trap OID does not start with it,
+    parsing stops as soon as the trap OID is seen.
+    Returns (parsed, trap_oid) with trap_oid as an integer tuple.
+    """
     parsed: dict[str, str] = {}
-    raw_oids: dict[str, str] = {}
+    trap_oid: tuple[int, ...] = ()
 
     for oid, val in var_binds:
-        oid_str = oid.prettyPrint()
-        val_str = val.prettyPrint()
-
-        # Try to resolve known Dell OID names
-        friendly = resolve_var_name(oid_str)
-        parsed[friendly] = val_str
-        raw_oids[oid_str] = val_str
+        # Match on the raw OID tuple; no need to render the OID as a string
+        oid_tuple = oid.asTuple()
 
-    return parsed, raw_oids
+        if oid_tuple == _TRAP_OID_TUPLE:
+            # A malformed trap may carry a non-OID value here; treat it as
+            # having no trap OID so it is skipped like any non-Dell trap
+            if not isinstance(val, univ.ObjectIdentifier):
+                return {}, ()
+            trap_oid = val.asTuple()
+            if early_exit_prefix is not None and trap_oid[:len(early_exit_prefix)] != early_exit_prefix:
+                return {}, trap_oid
+            continue
 
+        # Only render values that build_ntfy_message actually reads
+        friendly = TRAP_VARS_BY_TUPLE.get(oid_tuple)
+        if friendly in _NEEDED_VARS:
+            parsed[friendly] = val.prettyPrint()
 
-def determine_severity(parsed: dict) -> tuple[str, str]:
-    """Determine severity from parsed trap data."""
-    status_str = parsed.get("alertCurrentStatus", "")
-    try:
-        status_code = int(status_str)
-    except (ValueError, TypeError):
-        status_code = 0
-    return get_severity(status_code)
+    return parsed, trap_oid
 
 
-def build_ntfy_message(parsed: dict, trap_oid: str, source_addr: str) -> tuple[str, str, str, list[str]]:
+def build_ntfy_message(parsed: dict, trap_oid: tuple[int, ...], source_addr: str) -> tuple[str, str, str, list[str]]:
     """
     Build the ntfy notification from parsed trap data.
     Returns (title, message, priority, tags).
     """
     category = get_trap_category(trap_oid)
-    severity_name, emoji = determine_severity(parsed)
+    try:
+        status_code = int(parsed.get("alertCurrentStatus", ""))
+    except ValueError:
+        status_code = 0
+    severity_name, emoji, severity_priority = get_alert_tuple(status_code)
 
     # Title - just the alert message from iDRAC
     alert_msg = parsed.get("alertMessage", "No message provided")
@@ -128,18 +169,18 @@ def build_ntfy_message(parsed: dict, trap_oid: str, source_addr: str) -> tuple[s
     msg_id = parsed.get("alertMessageID", "N/A")
     fqdn = parsed.get("systemFQDN", source_addr)
     svc_tag = parsed.get("systemServiceTag", parsed.get("chassisServiceTag", "N/A"))
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-
-    lines = [
-        f"Host: {fqdn}",
-        f"Service Tag: {svc_tag}",
-        f"Severity: {severity_name}",
-        f"Time: {timestamp}",
-    ]
-    message = "\n".join(lines)
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime())
+
+    message = (
+        f"Host: {fqdn}\n"
+        f"Service Tag: {svc_tag}\n"
+        f"Severity: {severity_name}\n"
+        f"Category: {category}\n"
+        f"Time: {timestamp}"
+    )
 
     # Priority
-    priority = NTFY_PRIORITY or SEVERITY_TO_NTFY_PRIORITY.get(severity_name, "default")
+    priority = NTFY_PRIORITY or severity_priority
 
     # Tags - just severity-based tags
     tags = ["server"]
@@ -149,8 +190,8 @@ def build_ntfy_message(parsed: dict, trap_oid: str, source_addr: str) -> tuple[s
         tags.append("warning")
     elif severity_name == "ok":
         tags.append("white_check_mark")
-    if NTFY_TAGS:
-        tags.extend(t.strip() for t in NTFY_TAGS.split(",") if t.strip())
+    if _EXTRA_TAGS:
+        tags.extend(_EXTRA_TAGS)
 
     return title, message, priority, tags
 
@@ -162,40 +203,36 @@ def trap_callback(snmp_engine, state_reference, context_engine_id, context_name,
                   var_binds, cb_ctx):
     """Called by pysnmp whenever a trap/notification is received."""
     transport_domain, transport_address = snmp_engine.msgAndPduDsp.getTransportInfo(state_reference)
-    source_addr = f"{transport_address[0]}:{transport_address[1]}" if transport_address else "unknown"
+    if transport_address:
+        host, port = transport_address[0], transport_address[1]
+        source_addr = f"{host}:{port}"
+    else:
+        host = source_addr = "unknown"
 
     log.info("Trap received from %s", source_addr)
 
-    # Identify the trap OID (SNMPv2-MIB::snmpTrapOID.0 = 1.3.6.1.6.3.1.1.4.1.0)
-    trap_oid = ""
-    for oid, val in var_binds:
-        oid_str = oid.prettyPrint()
-        if oid_str == "1.3.6.1.6.3.1.1.4.1.0":
-            trap_oid = val.prettyPrint()
-            break
-
-    parsed, raw_oids = parse_trap_vars(var_binds)
+    # snmpTrapOID.0 is the second var-bind, so non-Dell traps stop parsing early
+    parsed, trap_oid = parse_trap_vars(var_binds, early_exit_prefix=_DELL_PREFIX)
 
-    log.debug("Trap OID: %s", trap_oid)
-    log.debug("Parsed vars: %s", parsed)
+    debug = log.isEnabledFor(logging.DEBUG)
+    if debug:
+        log.debug("Trap OID: %s", ".".join(map(str, trap_oid)))
 
     # Only process Dell iDRAC traps; log and skip others
-    if not trap_oid.startswith(DELL_ENTERPRISE_OID):
-        log.info("Non-Dell trap (%s) — skipping", trap_oid)
+    if trap_oid[:len(_DELL_PREFIX)] != _DELL_PREFIX:
+        if debug:
+            log.debug("Non-Dell trap (%s) — skipping", ".".join(map(str, trap_oid)))
         return
 
-    title, message, priority, tags = build_ntfy_message(
-        parsed, trap_oid, transport_address[0] if transport_address else "unknown"
-    )
+    if debug:
+        log.debug("Parsed vars: %s", parsed)
+
+    title, message, priority, tags = build_ntfy_message(parsed, trap_oid, host)
 
     log.info("Forwarding: %s [%s]", title, priority)
 
-    # Send in a thread to avoid blocking the SNMP engine
-    threading.Thread(
-        target=send_to_ntfy,
-        args=(title, message, priority, tags),
-        daemon=True,
-    ).start()
+    # Send on the worker pool to avoid blocking the SNMP engine
+    _EXECUTOR.submit(send_to_ntfy, title, message, priority, tags)
 
 
 # ---------------------------------------------------------------------------
@@ -235,7 +272,11 @@ def main() -> None:
     # Graceful shutdown
     def shutdown(signum, frame):
         log.info("Shutting down (signal %s) …", signum)
-        snmp_engine.transportDispatcher.jobFinished(1)
+        dispatcher = snmp_engine.transportDispatcher
+        dispatcher.jobFinished(1)
+        # jobFinished() only lowers the job counter; stop the asyncio loop so
+        # runDispatcher() returns and main() can drain the sender pool
+        dispatcher.loop.call_soon_threadsafe(dispatcher.loop.stop)
 
     signal.signal(signal.SIGTERM, shutdown)
     signal.signal(signal.SIGINT, shutdown)
@@ -246,6 +287,11 @@ def main() -> None:
     except Exception:
         snmp_engine.transportDispatcher.closeDispatcher()
         raise
+    finally:
+        # The dispatcher has stopped, so no new alerts can be submitted;
+        # let in-flight ones finish before closing the connection pool
+        _EXECUTOR.shutdown(wait=True, cancel_futures=False)
+        _SESSION.close()
 
     log.info("Stopped.")
 